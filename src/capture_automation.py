@@ -1,39 +1,196 @@
+import asyncio
 import json
+import os
+import re
+import subprocess
 import time
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, Dict, Any, Literal, List, Tuple, Union
-from playwright.sync_api import sync_playwright
+from string import Template
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Optional, Dict, Any, Literal, List, Tuple, Union, Iterator
+from playwright.async_api import async_playwright
+from playwright.sync_api import sync_playwright, BrowserContext, TimeoutError as PlaywrightTimeoutError
 from dotenv import load_dotenv
-from pydantic import BaseModel, Field, validator
-from urllib.parse import urlparse
+from pydantic import BaseModel, Field, field_validator, model_validator
+from urllib.parse import urldefrag, urlparse
+from urllib.error import HTTPError
+from urllib.request import urlopen
 
-load_dotenv()
+@lru_cache(maxsize=1)
+def _load_env() -> bool:
+    """.envを読み込む（一度だけ実行される）
+    
+    Playwrightのドライバは起動時の環境変数を引き継ぐため、
+    Playwrightを起動する前に必ず呼び出す
+    
+    Returns:
+        bool: .envを読み込んだ場合はTrue
+    """
+    return load_dotenv()
 
 BrowserType = Literal["chromium", "chrome", "firefox", "webkit"]
+WaitUntil = Literal["load", "domcontentloaded", "commit", "networkidle"]
+ImageFormat = Literal["png", "jpeg"]
+ResourceType = Literal["document", "stylesheet", "image", "media", "font", "script", "texttrack",
+                       "xhr", "fetch", "eventsource", "websocket", "manifest", "other"]
+
+# 画像形式ごとのファイル拡張子（先頭が既定の拡張子）
+_IMAGE_EXTENSIONS: Dict[str, Tuple[str, ...]] = {
+    "png": (".png",),
+    "jpeg": (".jpg", ".jpeg"),
+}
+
+# セレクタに使用できない文字を削除する変換テーブル（削除前後の長さで含有を判定する）
+_SELECTOR_FORBIDDEN_CHARS = str.maketrans('', '', '<>"\'')
+
+# ファイル名に使用できる文字（英数字と '._-'）
+_FILENAME_PATTERN = re.compile(r"[\w.-]+")
+
+# 一括キャプチャでセレクタの表示を待つ最大時間（ミリ秒）
+_SELECTOR_TIMEOUT_MS = 10000
+
+# キャプチャ結果HTMLのテンプレート（呼び出しごとに再構築しないようモジュール読み込み時に一度だけ作成）
+_HTML_TEMPLATE = Template('''
+        <!DOCTYPE html>
+        <html lang="en">
+        <head>
+            <meta charset="utf-8">
+            <meta name="viewport" content="width=device-width, initial-scale=1">
+            <title>Screenshot Results</title>
+            <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
+            <style>
+                body { 
+                    font-family: 'Segoe UI', system-ui, sans-serif;
+                    background-color: #f8f9fa;
+                    padding: 2rem;
+                }
+                .capture-card {
+                    background: white;
+                    border-radius: 8px;
+                    box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+                    margin-bottom: 2rem;
+                    overflow: hidden;
+                }
+                .capture-header {
+                    background: #f1f3f5;
+                    padding: 1rem;
+                    border-bottom: 1px solid #dee2e6;
+                }
+                .capture-content {
+                    padding: 1.5rem;
+                }
+                .screenshot {
+                    max-width: 100%;
+                    height: auto;
+                    border-radius: 4px;
+                    margin: 1rem 0;
+                    box-shadow: 0 1px 3px rgba(0,0,0,0.1);
+                }
+                .info-list {
+                    list-style: none;
+                    padding: 0;
+                }
+                .info-list li {
+                    margin-bottom: 0.5rem;
+                    color: #495057;
+                }
+                .timestamp {
+                    color: #868e96;
+                    font-size: 0.9rem;
+                    margin-top: 1rem;
+                }
+                .url-link {
+                    color: #228be6;
+                    text-decoration: none;
+                    word-break: break-all;
+                }
+                .url-link:hover {
+                    text-decoration: underline;
+                }
+            </style>
+        </head>
+        <body>
+            <div class="container">
+                <h1 class="mb-4">Screenshot Results</h1>
+                <div class="row">
+                    $captures
+                </div>
+            </div>
+            <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js"></script>
+        </body>
+        </html>
+        ''')
+
+_CAPTURE_TEMPLATE = Template('''
+        <div class="col-12 mb-4">
+            <div class="capture-card">
+                <div class="capture-header">
+                    <h2 class="h5 mb-0">
+                        <a href="$url" class="url-link" target="_blank">$url</a>
+                    </h2>
+                </div>
+                <div class="capture-content">
+                    <h3 class="h6 mb-3">Configuration</h3>
+                    <ul class="info-list">
+                        <li><strong>Wait Time:</strong> $wait_time seconds</li>
+                        <li><strong>Selector:</strong> $selector</li>
+                        <li><strong>Full Page:</strong> $fullpage</li>
+                        <li><strong>Viewport Size:</strong> $viewport_size</li>
+                        <li><strong>Filename:</strong> $filename</li>
+                    </ul>
+                    <img class="screenshot" src="$screenshot_path" alt="Screenshot">
+                    <p class="timestamp">Captured at: $timestamp</p>
+                </div>
+            </div>
+        </div>
+        ''')
+
+def parse_viewport_size(v: str) -> Tuple[int, int]:
+    """'widthxheight' 形式の文字列をビューポートサイズのタプルに変換する
+    
+    Args:
+        v (str): ビューポートサイズ (例: '1920x1080')
+    
+    Returns:
+        Tuple[int, int]: (width, height)
+    """
+    try:
+        width, height = map(int, v.lower().split('x'))
+    except ValueError:
+        raise ValueError("ビューポートサイズの形式が正しくありません。例: '1920x1080'")
+    return (width, height)
 
 class Capture(BaseModel):
     """キャプチャ情報を格納するクラス"""
     url: str = Field(..., description="URL to capture")
-    wait_time: int = Field(default=5, ge=0, description="Wait time after page load (seconds)")
+    wait_time: int = Field(default=5, ge=0, description="Max wait for network idle after page load (seconds)")
     selector: Optional[str] = Field(default=None, description="CSS selector to wait for")
     fullpage: bool = Field(default=True, description="Whether to capture full page")
     filename: Optional[str] = Field(default=None, description="Output filename")
     viewport_size: Optional[Tuple[int, int]] = Field(default=None, description="Viewport size (width, height)")
     screenshot_path: Optional[str] = Field(default=None, description="Path to saved screenshot")
+    wait_until: Optional[WaitUntil] = Field(default=None, description="Navigation event to wait for in page.goto (auto when None)")
+    block_resource_types: List[ResourceType] = Field(default_factory=list, description="Resource types to abort (e.g. font, media)")
+    block_url_patterns: List[str] = Field(default_factory=list, description="Abort requests whose URL contains any of these substrings")
+    format: ImageFormat = Field(default="png", description="Screenshot image format")
+    quality: int = Field(default=80, ge=0, le=100, description="JPEG quality (ignored for png)")
 
-    @validator('selector')
+    @field_validator('selector')
+    @classmethod
     def validate_selector(cls, v):
         """セレクタの形式を検証"""
         if v is not None:
             if not v.strip():
                 return None
             # 基本的なセレクタの形式チェック
-            if any(char in v for char in '<>"\''):
+            if len(v.translate(_SELECTOR_FORBIDDEN_CHARS)) != len(v):
                 raise ValueError("Invalid characters in selector")
         return v
 
-    @validator('url')
+    @field_validator('url')
+    @classmethod
     def validate_url(cls, v):
         """URLの形式を検証"""
         try:
@@ -44,18 +201,15 @@ class Capture(BaseModel):
         except Exception as e:
             raise ValueError(f"URLの形式が正しくありません: {e}")
 
-    @validator('viewport_size', pre=True)
+    @field_validator('viewport_size', mode='before')
+    @classmethod
     def validate_viewport_size(cls, v):
         """ビューポートサイズを検証し、文字列の場合は変換する"""
         if v is None:
             return None
             
         if isinstance(v, str):
-            try:
-                width, height = map(int, v.lower().split('x'))
-                return (width, height)
-            except ValueError:
-                raise ValueError("ビューポートサイズの形式が正しくありません。例: '1920x1080'")
+            return parse_viewport_size(v)
                 
         if isinstance(v, (list, tuple)) and len(v) == 2:
             width, height = v
@@ -72,22 +226,107 @@ class Capture(BaseModel):
         width, height = self.viewport_size
         return {"width": width, "height": height}
 
-    @validator('filename')
+    def get_wait_until(self) -> WaitUntil:
+        """page.gotoに渡す待機イベントを返す
+        
+        未指定の場合、セレクタ待機が後続するなら "commit"、それ以外は "domcontentloaded" を使う
+        """
+        if self.wait_until is not None:
+            return self.wait_until
+        return "commit" if self.selector else "domcontentloaded"
+
+    def blocks_requests(self) -> bool:
+        """ブロック対象のリクエスト設定があるかを返す"""
+        return bool(self.block_resource_types or self.block_url_patterns)
+
+    def should_block_request(self, resource_type: str, url: str) -> bool:
+        """指定されたリクエストをブロックするかを判定する"""
+        return resource_type in self.block_resource_types or any(p in url for p in self.block_url_patterns)
+
+    @field_validator('filename')
+    @classmethod
     def validate_filename(cls, v):
         """ファイル名を検証"""
         if v is not None:
-            if not v.endswith('.png'):
-                v = f"{v}.png"
-            if not all(c.isalnum() or c in '._-' for c in v):
+            if not _FILENAME_PATTERN.fullmatch(v):
                 raise ValueError("ファイル名に使用できない文字が含まれています")
         return v
 
+    @model_validator(mode='after')
+    def apply_file_extension(self):
+        """ファイル名の拡張子を画像形式に合わせる"""
+        if self.filename is not None and not self.filename.lower().endswith(_IMAGE_EXTENSIONS[self.format]):
+            self.filename = f"{self.filename}{self.get_file_extension()}"
+        return self
+
+    def get_file_extension(self) -> str:
+        """画像形式に対応するファイル拡張子を返す"""
+        return _IMAGE_EXTENSIONS[self.format][0]
+
+    def get_screenshot_options(self) -> Dict[str, Any]:
+        """page.screenshotに渡すオプションを返す"""
+        options: Dict[str, Any] = {"full_page": self.fullpage, "type": self.format}
+        # qualityはJPEGの場合のみ指定できる
+        if self.format == "jpeg":
+            options["quality"] = self.quality
+        return options
+
 class CaptureAutomation:
-    def __init__(self, session_file_path: str = "browser_session.json") -> None:
+    def __init__(self,
+                 session_file_path: str = "browser_session.json",
+                 user_data_dir: str = "data/profile") -> None:
         self.session_file = Path(session_file_path)
+        # HTTPキャッシュ等を実行間で再利用するためのブラウザプロファイル
+        self.user_data_dir = Path(user_data_dir)
         
         # セッション保存用ディレクトリの作成
         self.session_file.parent.mkdir(parents=True, exist_ok=True)
+        
+        # with ブロック内で使い回すPlaywrightとブラウザコンテキスト
+        self._playwright = None
+        self._context = None
+        # with ブロックの入れ子の深さ（共有インスタンスを入れ子で使ってもブラウザは一度だけ起動する）
+        self._enter_depth = 0
+    
+    def __enter__(self) -> "CaptureAutomation":
+        """ブラウザを起動し、with ブロックの間 capture/captures で使い回す
+        
+        例:
+            with CaptureAutomation() as ca:
+                for capture in captures:
+                    ca.capture(capture)
+        
+        入れ子の with ブロックでは起動済みのブラウザをそのまま使い、最も外側の with ブロックを抜けた時に終了する
+        """
+        if self._enter_depth > 0:
+            self._enter_depth += 1
+            return self
+        
+        _load_env()
+        self._playwright = sync_playwright().start()
+        try:
+            self._context = self._launch_capture_context(self._playwright)
+        except Exception:
+            self._playwright.stop()
+            self._playwright = None
+            raise
+        self._enter_depth = 1
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        """使い回していたブラウザとPlaywrightを終了する"""
+        self._enter_depth -= 1
+        if self._enter_depth > 0:
+            return
+        
+        try:
+            if self._context is not None:
+                self._context.close()
+        finally:
+            self._context = None
+            if self._playwright is not None:
+                self._playwright.stop()
+                self._playwright = None
     
     def login(self, 
               login_url: str, 
@@ -102,7 +341,7 @@ class CaptureAutomation:
         Returns:
             Optional[str]: 保存されたセッションファイルのパス、失敗時はNone
         """
-        with sync_playwright() as p:
+        with self._playwright_instance() as p:
             browser = self._launch_browser(p)
             
             # コンテキスト作成オプションの準備
@@ -135,16 +374,29 @@ class CaptureAutomation:
             # セッション情報の保存
             try:
                 storage_state = context.storage_state()
-                with open(self.session_file, "w") as f:
-                    json.dump(storage_state, f)
-                print("ブラウザが閉じられました。セッション情報を保存しました。")
+                # json.dump は純Pythonのエンコーダで少しずつ書き込むため、C実装の json.dumps で一括変換して書き込む
+                serialized = json.dumps(storage_state).encode("utf-8")
+                
+                # 内容が変わっていなければ書き込みを省略する（サイズが異なれば読み込まずに判定できる）
+                if (self.session_file.exists()
+                        and self.session_file.stat().st_size == len(serialized)
+                        and self.session_file.read_bytes() == serialized):
+                    print("ブラウザが閉じられました。セッション情報に変更はありません。")
+                else:
+                    self.session_file.write_bytes(serialized)
+                    print("ブラウザが閉じられました。セッション情報を保存しました。")
+                
+                # with ブロックで起動中のブラウザがあれば、ログイン後のCookieを反映する
+                if self._context is not None and storage_state.get("cookies"):
+                    self._context.add_cookies(storage_state["cookies"])
             except Exception as e:
                 print(f"セッション情報の保存中にエラーが発生しました: {e}")
                 return None
             
             try:
-                # コンテキストを閉じる（ブラウザも自動的に閉じられる）
+                # コンテキストとブラウザを閉じる（with ブロック内でもPlaywrightは終了しないため明示的に閉じる）
                 context.close()
+                browser.close()
             except Exception as e:
                 print(f"ブラウザを閉じる処理中にエラーが発生しました: {e}")
             
@@ -176,271 +428,631 @@ class CaptureAutomation:
         screenshots_path = Path(screenshots_dir)
         screenshots_path.mkdir(parents=True, exist_ok=True)
         
-        with sync_playwright() as p:
-            # ブラウザの起動
-            browser = self._launch_browser(p)
-            
-            # コンテキスト作成オプションの準備
-            context_options: Dict[str, Any] = {}
-            
-            # ビューポートサイズが指定されていれば設定
-            viewport_dict = capture.get_viewport_dict()
-            if viewport_dict:
-                context_options["viewport"] = viewport_dict
-            
-            # セッション情報があればそれを使用してコンテキストを作成
-            if self.session_file.exists():
-                context_options["storage_state"] = str(self.session_file)
-                context = browser.new_context(**context_options)
-            else:
-                context = browser.new_context(**context_options)
-            
+        with self._browser_context() as context:
             page = context.new_page()
             
-            # 指定されたURLに移動
-            page.goto(capture.url)
-            
-            # 指定されたセレクタが表示されるまで待機
-            if capture.selector:
-                page.wait_for_selector(capture.selector, state="visible")
-            
-            # 追加の待機時間（ページの動的コンテンツ読み込みのため）
-            time.sleep(capture.wait_time)
-            
-            # ファイル名の生成
-            if not capture.filename:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                capture.filename = f"screenshot_{timestamp}.png"
-            
-            # パスの生成
-            screenshot_path = screenshots_path / capture.filename
-            
-            # スクリーンショットの取得
-            page.screenshot(path=str(screenshot_path), full_page=capture.fullpage)
-            
-            # 保存されたパスを設定
-            capture.screenshot_path = str(screenshot_path)
-            
-            print(f"スクリーンショットを保存しました: {screenshot_path}")
-            
-            # ブラウザを閉じる
-            browser.close()
-            
-            return str(screenshot_path)
-            
-    def captures(self, 
-                captures: List[Capture],
-                screenshots_dir: str = "screenshots") -> List[Capture]:
-        """複数のURLのスクリーンショットを一括で取得する
-        
-        Args:
-            captures (List[Capture]): キャプチャ情報のリスト
-            screenshots_dir (str): スクリーンショットを保存するディレクトリパス
-            
-        Returns:
-            List[Capture]: スクリーンショットのパスが設定されたキャプチャ情報のリスト
-        """
-        # スクリーンショット保存用ディレクトリの作成
-        screenshots_path = Path(screenshots_dir)
-        screenshots_path.mkdir(parents=True, exist_ok=True)
-        
-        # 結果のHTMLを生成するためのテンプレート
-        html_template = '''
-        <!DOCTYPE html>
-        <html lang="en">
-        <head>
-            <meta charset="utf-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1">
-            <title>Screenshot Results</title>
-            <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
-            <style>
-                body {{ 
-                    font-family: 'Segoe UI', system-ui, sans-serif;
-                    background-color: #f8f9fa;
-                    padding: 2rem;
-                }}
-                .capture-card {{
-                    background: white;
-                    border-radius: 8px;
-                    box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-                    margin-bottom: 2rem;
-                    overflow: hidden;
-                }}
-                .capture-header {{
-                    background: #f1f3f5;
-                    padding: 1rem;
-                    border-bottom: 1px solid #dee2e6;
-                }}
-                .capture-content {{
-                    padding: 1.5rem;
-                }}
-                .screenshot {{
-                    max-width: 100%;
-                    height: auto;
-                    border-radius: 4px;
-                    margin: 1rem 0;
-                    box-shadow: 0 1px 3px rgba(0,0,0,0.1);
-                }}
-                .info-list {{
-                    list-style: none;
-                    padding: 0;
-                }}
-                .info-list li {{
-                    margin-bottom: 0.5rem;
-                    color: #495057;
-                }}
-                .timestamp {{
-                    color: #868e96;
-                    font-size: 0.9rem;
-                    margin-top: 1rem;
-                }}
-                .url-link {{
-                    color: #228be6;
-                    text-decoration: none;
-                    word-break: break-all;
-                }}
-                .url-link:hover {{
-                    text-decoration: underline;
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <h1 class="mb-4">Screenshot Results</h1>
-                <div class="row">
-                    {captures}
-                </div>
-            </div>
-            <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js"></script>
-        </body>
-        </html>
-        '''
-        
-        capture_template = '''
-        <div class="col-12 mb-4">
-            <div class="capture-card">
-                <div class="capture-header">
-                    <h2 class="h5 mb-0">
-                        <a href="{url}" class="url-link" target="_blank">{url}</a>
-                    </h2>
-                </div>
-                <div class="capture-content">
-                    <h3 class="h6 mb-3">Configuration</h3>
-                    <ul class="info-list">
-                        <li><strong>Wait Time:</strong> {wait_time} seconds</li>
-                        <li><strong>Selector:</strong> {selector}</li>
-                        <li><strong>Full Page:</strong> {fullpage}</li>
-                        <li><strong>Viewport Size:</strong> {viewport_size}</li>
-                        <li><strong>Filename:</strong> {filename}</li>
-                    </ul>
-                    <img class="screenshot" src="{screenshot_path}" alt="Screenshot">
-                    <p class="timestamp">Captured at: {timestamp}</p>
-                </div>
-            </div>
-        </div>
-        '''
-        
-        with sync_playwright() as p:
-            # ブラウザの起動
-            browser = self._launch_browser(p)
-            
-            capture_results = []
-            
-            for capture in captures:
-                # コンテキスト作成オプションの準備
-                context_options: Dict[str, Any] = {}
-                
+            try:
                 # ビューポートサイズが指定されていれば設定
                 viewport_dict = capture.get_viewport_dict()
                 if viewport_dict:
-                    context_options["viewport"] = viewport_dict
-                
-                # セッション情報があればそれを使用してコンテキストを作成
-                if self.session_file.exists():
-                    context_options["storage_state"] = str(self.session_file)
-                    context = browser.new_context(**context_options)
-                else:
-                    context = browser.new_context(**context_options)
+                    page.set_viewport_size(viewport_dict)
                 
-                page = context.new_page()
+                self._block_requests(page, capture)
                 
                 # 指定されたURLに移動
-                page.goto(capture.url)
+                page.goto(capture.url, wait_until=capture.get_wait_until())
                 
                 # 指定されたセレクタが表示されるまで待機
                 if capture.selector:
-                    try:
-                        page.wait_for_selector(capture.selector, state="visible", timeout=10000)  # タイムアウトを10秒に設定
-                    except Exception as e:
-                        print(f"Warning: Selector '{capture.selector}' not found for {capture.url}")
-                        print(f"Error details: {e}")
-                        # セレクタが見つからなくても続行
+                    page.wait_for_selector(capture.selector, state="visible")
                 
-                # 追加の待機時間（ページの動的コンテンツ読み込みのため）
-                time.sleep(capture.wait_time)
+                # 動的コンテンツの読み込み待ち（ネットワークが落ち着けば wait_time を待たずに進む）
+                self._wait_for_network_idle(page, capture.wait_time)
                 
                 # ファイル名の生成
                 if not capture.filename:
                     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    capture.filename = f"screenshot_{timestamp}.png"
+                    capture.filename = f"screenshot_{timestamp}{capture.get_file_extension()}"
                 
                 # パスの生成
                 screenshot_path = screenshots_path / capture.filename
                 
                 # スクリーンショットの取得
-                page.screenshot(path=str(screenshot_path), full_page=capture.fullpage)
+                page.screenshot(path=str(screenshot_path), **capture.get_screenshot_options())
                 
                 # 保存されたパスを設定
                 capture.screenshot_path = str(screenshot_path)
                 
-                # キャプチャ結果をリストに追加
-                capture_results.append(capture)
-                
-                print(f"キャプチャを保存しました: {screenshot_path}")
-                
-                # ページを閉じる（メモリ解放のため）
+                print(f"スクリーンショットを保存しました: {screenshot_path}")
+            finally:
+                # タイムアウト等で失敗した場合も、共有中のブラウザにタブを残さないよう閉じる
                 page.close()
-                context.close()
+        
+        return str(screenshot_path)
             
-            # すべてのキャプチャが完了したらブラウザを閉じる
-            browser.close()
+    def captures(self, 
+                captures: List[Capture],
+                screenshots_dir: str = "screenshots",
+                burst_mode: bool = False) -> List[Capture]:
+        """複数のURLのスクリーンショットを一括で取得する
+        
+        Args:
+            captures (List[Capture]): キャプチャ情報のリスト
+            screenshots_dir (str): スクリーンショットを保存するディレクトリパス
+            burst_mode (bool): Trueの場合、ホストが変わっても同じタブを使い回し、
+                タブの作成やビューポート設定をキャプチャごとに繰り返さない
             
-            # 結果のHTMLを生成
-            captures_html = []
-            for capture in capture_results:
-                # スクリーンショットの相対パスを生成
-                relative_path = f"screenshots/{Path(capture.screenshot_path).name}"
-                
-                captures_html.append(capture_template.format(
-                    url=capture.url,
-                    wait_time=capture.wait_time,
-                    selector=capture.selector or "なし",
-                    fullpage="はい" if capture.fullpage else "いいえ",
-                    viewport_size=f"{capture.viewport_size[0]}x{capture.viewport_size[1]}" if capture.viewport_size else "デフォルト",
-                    filename=capture.filename,
-                    screenshot_path=relative_path,
-                    timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                ))
+        Returns:
+            List[Capture]: スクリーンショットのパスが設定されたキャプチャ情報のリスト
+        """
+        return list(self.iter_captures(captures, screenshots_dir, burst_mode))
+
+    def iter_captures(self, 
+                      captures: List[Capture],
+                      screenshots_dir: str = "screenshots",
+                      burst_mode: bool = False) -> Iterator[Capture]:
+        """複数のURLのスクリーンショットを順に取得し、1件保存するごとに返す
+        
+        全件の完了を待たずに結果を後続の処理（Excelへの貼り付けなど）に渡せる。
+        結果のHTMLは最後まで取得した時点で生成する
+        
+        Args:
+            captures (List[Capture]): キャプチャ情報のリスト
+            screenshots_dir (str): スクリーンショットを保存するディレクトリパス
+            burst_mode (bool): Trueの場合、ホストが変わっても同じタブを使い回し、
+                タブの作成やビューポート設定をキャプチャごとに繰り返さない
             
-            # HTMLファイルを保存
-            result_html = html_template.format(captures="\n".join(captures_html))
-            result_path = Path(".") / "capture_results.html"
-            with open(result_path, "w", encoding="utf-8") as f:
-                f.write(result_html)
+        Yields:
+            Capture: スクリーンショットのパスが設定されたキャプチャ情報（入力順）
+        """
+        # スクリーンショット保存用ディレクトリの作成
+        screenshots_path = Path(screenshots_dir)
+        screenshots_path.mkdir(parents=True, exist_ok=True)
+        
+        # ファイル名の生成
+        self._assign_default_filenames(captures)
+        
+        # コンテキストは全キャプチャで共有する
+        with self._browser_context() as context:
+            capture_results = []
             
-            print(f"結果のHTMLを保存しました: {result_path}")
+            # 同じホストへのキャプチャが続く間は同じタブを使い回し、読み込み済みのJSやキャッシュを活かす
+            page = None
+            page_key = None
             
+            try:
+                for capture in captures:
+                    key = self._page_key(capture, burst_mode)
+                    if page is None or key != page_key or self._is_same_document(page, capture):
+                        if page is not None:
+                            page.close()
+                        page = context.new_page()
+                        page_key = key
+                        
+                        # ビューポートサイズが指定されていれば設定
+                        viewport_dict = capture.get_viewport_dict()
+                        if viewport_dict:
+                            page.set_viewport_size(viewport_dict)
+                        
+                        self._block_requests(page, capture)
+                    
+                    # 指定されたURLに移動
+                    page.goto(capture.url, wait_until=capture.get_wait_until())
+                    
+                    # 指定されたセレクタが表示されるまで待機（見つからなくても続行）
+                    self._wait_for_selector(page, capture)
+                    
+                    # 動的コンテンツの読み込み待ち（ネットワークが落ち着けば wait_time を待たずに進む）
+                    self._wait_for_network_idle(page, capture.wait_time)
+                    
+                    # パスの生成
+                    screenshot_path = screenshots_path / capture.filename
+                    
+                    # スクリーンショットの取得
+                    page.screenshot(path=str(screenshot_path), **capture.get_screenshot_options())
+                    
+                    # 保存されたパスを設定
+                    capture.screenshot_path = str(screenshot_path)
+                    
+                    # キャプチャ結果をリストに追加
+                    capture_results.append(capture)
+                    
+                    print(f"キャプチャを保存しました: {screenshot_path}")
+                    
+                    yield capture
+            finally:
+                # ページを閉じる（メモリ解放のため。途中で打ち切られた場合も閉じる）
+                if page is not None:
+                    page.close()
+        
+        # 結果のHTMLを生成
+        self._write_results_html(capture_results)
+
+    async def captures_async(self,
+                             captures: List[Capture],
+                             screenshots_dir: str = "screenshots",
+                             concurrency: int = 5) -> List[Capture]:
+        """複数のURLのスクリーンショットを並行して取得する
+
+        1つのブラウザ・コンテキストを共有し、最大 concurrency 個のページを同時に開いて処理する
+
+        Args:
+            captures (List[Capture]): キャプチャ情報のリスト
+            screenshots_dir (str): スクリーンショットを保存するディレクトリパス
+            concurrency (int): 同時に開くページ数の上限
+
+        Returns:
+            List[Capture]: スクリーンショットのパスが設定されたキャプチャ情報のリスト（入力順）
+        """
+        # スクリーンショット保存用ディレクトリの作成
+        screenshots_path = Path(screenshots_dir)
+        screenshots_path.mkdir(parents=True, exist_ok=True)
+
+        # ファイル名の生成
+        self._assign_default_filenames(captures)
+
+        _load_env()
+        async with async_playwright() as p:
+            # ブラウザを起動し、コンテキストは全ページで共有する
+            if self._cdp_endpoint():
+                # 常駐ブラウザに接続し、セッション情報を反映したコンテキストを作成
+                browser = await self._launch_browser(p)
+                context = await browser.new_context(**self._session_context_options())
+            else:
+                # 永続プロファイルで起動し、セッション情報のCookieを反映
+                context = await p.chromium.launch_persistent_context(**self._persistent_context_options())
+                cookies = self._session_cookies()
+                if cookies:
+                    await context.add_cookies(cookies)
+
+            semaphore = asyncio.Semaphore(max(1, concurrency))
+
+            async def capture_one(capture: Capture) -> Capture:
+                async with semaphore:
+                    page = await context.new_page()
+
+                    try:
+                        # ビューポートサイズが指定されていれば設定
+                        viewport_dict = capture.get_viewport_dict()
+                        if viewport_dict:
+                            await page.set_viewport_size(viewport_dict)
+
+                        # 不要なリクエストのブロック
+                        await self._block_requests_async(page, capture)
+
+                        # 指定されたURLに移動
+                        await page.goto(capture.url, wait_until=capture.get_wait_until())
+
+                        # 指定されたセレクタが表示されるまで待機（見つからなくても続行）
+                        await self._wait_for_selector_async(page, capture)
+
+                        # 動的コンテンツの読み込み待ち（ネットワークが落ち着けば wait_time を待たずに進む）
+                        await self._wait_for_network_idle_async(page, capture.wait_time)
+
+                        # パスの生成
+                        screenshot_path = screenshots_path / capture.filename
+
+                        # スクリーンショットの取得
+                        await page.screenshot(path=str(screenshot_path), **capture.get_screenshot_options())
+
+                        # 保存されたパスを設定
+                        capture.screenshot_path = str(screenshot_path)
+
+                        print(f"キャプチャを保存しました: {screenshot_path}")
+
+                        return capture
+                    finally:
+                        # ページを閉じる（メモリ解放のため。失敗した場合も閉じる）
+                        await page.close()
+
+            # gatherは入力順に結果を返す
+            capture_results = list(await asyncio.gather(*(capture_one(c) for c in captures)))
+
+            # すべてのキャプチャが完了したらコンテキストを閉じる（常駐ブラウザ自体は閉じない）
+            await context.close()
+
+            # 結果のHTMLを生成
+            self._write_results_html(capture_results)
+
             return capture_results
 
+    def captures_parallel(self,
+                          captures: List[Capture],
+                          screenshots_dir: str = "screenshots",
+                          concurrency: int = 5) -> List[Capture]:
+        """captures_async の同期版ラッパー
+
+        with ブロックでブラウザを起動済みの場合、プロファイルは同時に1つのブラウザしか
+        開けないため、起動済みのブラウザを使って captures で順に取得する
+
+        Args:
+            captures (List[Capture]): キャプチャ情報のリスト
+            screenshots_dir (str): スクリーンショットを保存するディレクトリパス
+            concurrency (int): 同時に開くページ数の上限
+
+        Returns:
+            List[Capture]: スクリーンショットのパスが設定されたキャプチャ情報のリスト（入力順）
+        """
+        if self._context is not None:
+            return self.captures(captures, screenshots_dir)
+        return asyncio.run(self.captures_async(captures, screenshots_dir, concurrency))
+
+    def start_browser_daemon(self, port: int = 9222, pid_file: str = "data/browser_daemon.json") -> str:
+        """リモートデバッグを有効にしたChromiumを常駐プロセスとして起動する
+        
+        返されたエンドポイントを環境変数 PLAYWRIGHT_CDP_ENDPOINT に設定すると、
+        以降の実行はブラウザを起動せずにこのプロセスへ接続する
+        
+        with ブロックでブラウザを起動済みの場合は、そのブラウザがプロファイルを使用中のため起動しない
+        
+        Args:
+            port (int): リモートデバッグ用のポート番号
+            pid_file (str): プロセスIDとエンドポイントを書き出すファイルのパス
+            
+        Returns:
+            str: 接続用のエンドポイント
+        """
+        if self._context is not None:
+            raise RuntimeError(f"ブラウザプロファイルは起動中のブラウザが使用しています: {self.user_data_dir}")
+        
+        endpoint = f"http://localhost:{port}"
+        
+        # 既にポートで応答しているブラウザがあれば、起動したプロセスが既存のブラウザに処理を引き渡して
+        # 終了しても待機が成功してしまうため、起動前に確認する
+        if self._devtools_responding(endpoint):
+            raise RuntimeError(f"ポート {port} は既に別のプロセスが使用しています: {endpoint}")
+        
+        with self._playwright_instance() as p:
+            executable_path = p.chromium.executable_path
+        
+        self.user_data_dir.mkdir(parents=True, exist_ok=True)
+        process = subprocess.Popen(
+            [
+                executable_path,
+                f"--remote-debugging-port={port}",
+                f"--user-data-dir={self.user_data_dir.resolve()}",
+                "--no-first-run",
+                "--no-default-browser-check"
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True
+        )
+        
+        # DevToolsのエンドポイントが応答するまで待機（起動したプロセスが終了した場合は失敗とする）
+        deadline = time.monotonic() + 30
+        while not self._devtools_responding(endpoint):
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                raise RuntimeError(f"ブラウザの起動に失敗しました: {endpoint}")
+            time.sleep(0.2)
+        
+        if process.poll() is not None:
+            raise RuntimeError(f"ブラウザの起動に失敗しました: {endpoint}")
+        
+        pid_path = Path(pid_file)
+        pid_path.parent.mkdir(parents=True, exist_ok=True)
+        pid_path.write_text(json.dumps({"pid": process.pid, "endpoint": endpoint}), encoding="utf-8")
+        
+        return endpoint
+
+    def _devtools_responding(self, endpoint: str) -> bool:
+        """DevToolsのエンドポイント（ポート）がHTTPで応答するかを返す
+        
+        Args:
+            endpoint (str): 接続用のエンドポイント
+            
+        Returns:
+            bool: 応答した場合はTrue
+        """
+        try:
+            with urlopen(f"{endpoint}/json/version", timeout=1):
+                return True
+        except HTTPError as e:
+            # エラーでもHTTPで応答があれば、ポートは他のプロセスが使用している
+            e.close()
+            return True
+        except OSError:
+            return False
+
+    def _write_results_html(self, capture_results: List[Capture]) -> Path:
+        """キャプチャ結果の一覧HTMLを生成して保存する
+        
+        Args:
+            capture_results (List[Capture]): スクリーンショットのパスが設定されたキャプチャ情報のリスト
+            
+        Returns:
+            Path: 保存されたHTMLファイルのパス
+        """
+        # 一括処理の結果なので、取得日時はバッチ全体で共通の値を使う
+        captured_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        
+        captures_html = []
+        for capture in capture_results:
+            # スクリーンショットの相対パスを生成
+            relative_path = f"screenshots/{Path(capture.screenshot_path).name}"
+            
+            captures_html.append(_CAPTURE_TEMPLATE.substitute(
+                url=capture.url,
+                wait_time=capture.wait_time,
+                selector=capture.selector or "なし",
+                fullpage="はい" if capture.fullpage else "いいえ",
+                viewport_size=f"{capture.viewport_size[0]}x{capture.viewport_size[1]}" if capture.viewport_size else "デフォルト",
+                filename=capture.filename,
+                screenshot_path=relative_path,
+                timestamp=captured_at
+            ))
+        
+        # HTMLファイルを保存
+        result_path = Path(".") / "capture_results.html"
+        result_path.write_text(_HTML_TEMPLATE.substitute(captures="\n".join(captures_html)), encoding="utf-8")
+        
+        print(f"結果のHTMLを保存しました: {result_path}")
+        
+        return result_path
+
+    def _assign_default_filenames(self, captures: List[Capture]) -> None:
+        """ファイル名が未指定のキャプチャに連番付きのファイル名を割り当てる
+        
+        同じ秒に複数のキャプチャを保存してもファイル名が衝突しないよう、
+        バッチ共通のタイムスタンプに入力順の番号を付ける
+        
+        Args:
+            captures (List[Capture]): キャプチャ情報のリスト
+        """
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        for i, capture in enumerate(captures):
+            if not capture.filename:
+                capture.filename = f"screenshot_{timestamp}_{i:04d}{capture.get_file_extension()}"
+
+    def _page_key(self, capture: Capture, burst_mode: bool = False) -> Tuple[Any, ...]:
+        """タブを使い回せるかの判定に使うキーを返す
+        
+        ホスト・ビューポートサイズ・リクエストのブロック設定が同じキャプチャは同じタブで処理する
+        
+        Args:
+            capture (Capture): キャプチャ情報
+            burst_mode (bool): Trueの場合はホストを判定に含めない
+            
+        Returns:
+            Tuple[Any, ...]: 判定用のキー
+        """
+        return (
+            None if burst_mode else urlparse(capture.url).netloc,
+            capture.viewport_size,
+            tuple(capture.block_resource_types),
+            tuple(capture.block_url_patterns)
+        )
+
+    def _is_same_document(self, page, capture: Capture) -> bool:
+        """表示中のページからキャプチャ対象のURLへの遷移が同一ドキュメント内の遷移になるかを返す
+        
+        フラグメント（#以降）のみが異なるURLへのgotoはページを読み込み直さず、
+        読み込み完了やネットワークアイドルの待機がすぐに終わってしまうため、新しいタブで開く必要がある
+        
+        Args:
+            page: Playwrightのページ
+            capture (Capture): キャプチャ情報
+            
+        Returns:
+            bool: 同一ドキュメント内の遷移になる場合はTrue
+        """
+        return "#" in capture.url and urldefrag(page.url).url == urldefrag(capture.url).url
+
+    def _block_requests(self, page, capture: Capture) -> None:
+        """キャプチャ設定に従って不要なリクエストを中断するルートを設定する
+        
+        Playwrightはルーティングを有効にするとHTTPキャッシュを使わなくなるため、
+        ブロック対象が指定されている場合のみ設定する
+        
+        Args:
+            page: Playwrightのページ
+            capture (Capture): キャプチャ情報
+        """
+        if not capture.blocks_requests():
+            return
+        
+        def handle_route(route):
+            request = route.request
+            if capture.should_block_request(request.resource_type, request.url):
+                route.abort()
+            else:
+                route.continue_()
+        
+        page.route("**/*", handle_route)
+
+    async def _block_requests_async(self, page, capture: Capture) -> None:
+        """_block_requests の非同期API版"""
+        if not capture.blocks_requests():
+            return
+        
+        async def handle_route(route):
+            request = route.request
+            if capture.should_block_request(request.resource_type, request.url):
+                await route.abort()
+            else:
+                await route.continue_()
+        
+        await page.route("**/*", handle_route)
+
+    def _wait_for_network_idle(self, page, wait_time: int) -> None:
+        """ネットワークがアイドルになるまで最大 wait_time 秒待機する
+        
+        Args:
+            page: Playwrightのページ
+            wait_time (int): 最大待機時間（秒）。0の場合は待機しない
+        """
+        # timeout=0 は無制限待機になるため、0秒指定時は待機しない
+        if wait_time <= 0:
+            return
+        try:
+            page.wait_for_load_state("networkidle", timeout=wait_time * 1000)
+        except PlaywrightTimeoutError:
+            # 上限に達しても今まで通りキャプチャを続行
+            pass
+
+    async def _wait_for_network_idle_async(self, page, wait_time: int) -> None:
+        """_wait_for_network_idle の非同期API版"""
+        if wait_time <= 0:
+            return
+        try:
+            await page.wait_for_load_state("networkidle", timeout=wait_time * 1000)
+        except PlaywrightTimeoutError:
+            pass
+
+    def _wait_for_selector(self, page, capture: Capture) -> None:
+        """指定されたセレクタが表示されるまで最大 _SELECTOR_TIMEOUT_MS 待機する
+        
+        一括キャプチャでは1件の失敗で全体を止めないよう、見つからなくても警告のみで続行する
+        
+        Args:
+            page: Playwrightのページ
+            capture (Capture): キャプチャ情報
+        """
+        if not capture.selector:
+            return
+        try:
+            page.wait_for_selector(capture.selector, state="visible", timeout=_SELECTOR_TIMEOUT_MS)
+        except Exception as e:
+            self._warn_selector_not_found(capture, e)
+
+    async def _wait_for_selector_async(self, page, capture: Capture) -> None:
+        """_wait_for_selector の非同期API版"""
+        if not capture.selector:
+            return
+        try:
+            await page.wait_for_selector(capture.selector, state="visible", timeout=_SELECTOR_TIMEOUT_MS)
+        except Exception as e:
+            self._warn_selector_not_found(capture, e)
+
+    def _warn_selector_not_found(self, capture: Capture, error: Exception) -> None:
+        """セレクタが見つからなかった旨の警告を表示する"""
+        print(f"Warning: Selector '{capture.selector}' not found for {capture.url}")
+        print(f"Error details: {error}")
+
+    def _persistent_context_options(self) -> Dict[str, Any]:
+        """永続プロファイルでブラウザを起動する際のオプションを組み立てる
+        
+        ビューポートサイズはキャプチャごとにページ単位で設定する
+        
+        Returns:
+            Dict[str, Any]: launch_persistent_contextに渡すオプション
+        """
+        self.user_data_dir.mkdir(parents=True, exist_ok=True)
+        
+        return {
+            "user_data_dir": str(self.user_data_dir),
+            "headless": False
+        }
+
+    def _session_cookies(self) -> List[Dict[str, Any]]:
+        """保存されたセッション情報からCookieを読み込む
+        
+        永続プロファイルにはstorage_stateを直接渡せないため、ログイン時に保存した
+        Cookieを起動後のコンテキストに追加して反映する
+        
+        Returns:
+            List[Dict[str, Any]]: Cookieのリスト、セッション情報がない場合は空リスト
+        """
+        if not self.session_file.exists():
+            return []
+        with open(self.session_file, "r") as f:
+            storage_state = json.load(f)
+        return storage_state.get("cookies", [])
+
+    def _session_context_options(self) -> Dict[str, Any]:
+        """セッション情報を反映したコンテキストを作成する際のオプションを組み立てる
+        
+        Returns:
+            Dict[str, Any]: new_contextに渡すオプション
+        """
+        if self.session_file.exists():
+            return {"storage_state": str(self.session_file)}
+        return {}
+
+    def _launch_capture_context(self, playwright):
+        """キャプチャに使うブラウザコンテキストを起動する
+        
+        常駐ブラウザのエンドポイントが設定されていれば接続してセッション情報付きのコンテキストを作成し、
+        そうでなければ永続プロファイルでブラウザを起動してセッション情報のCookieを反映する
+        
+        Args:
+            playwright: Playwrightインスタンス
+            
+        Returns:
+            BrowserContext: 起動されたブラウザのコンテキスト
+        """
+        if self._cdp_endpoint():
+            browser = self._launch_browser(playwright)
+            return browser.new_context(**self._session_context_options())
+        
+        context = playwright.chromium.launch_persistent_context(**self._persistent_context_options())
+        
+        cookies = self._session_cookies()
+        if cookies:
+            context.add_cookies(cookies)
+        
+        return context
+
+    @contextmanager
+    def _playwright_instance(self) -> Iterator[Any]:
+        """Playwrightインスタンスを返す
+        
+        同一スレッドで同期APIを二重に起動できないため、with ブロック内では起動済みのものを使う
+        
+        Yields:
+            Playwright: Playwrightインスタンス
+        """
+        if self._playwright is not None:
+            yield self._playwright
+            return
+        
+        _load_env()
+        with sync_playwright() as p:
+            yield p
+
+    @contextmanager
+    def _browser_context(self) -> Iterator[BrowserContext]:
+        """キャプチャに使うブラウザコンテキストを返す
+        
+        with ブロックで起動済みならそのコンテキストを使い回し、
+        そうでなければこの呼び出しの間だけブラウザを起動する
+        
+        Yields:
+            BrowserContext: ブラウザコンテキスト
+        """
+        if self._context is not None:
+            yield self._context
+            return
+        
+        with self._playwright_instance() as p:
+            context = self._launch_capture_context(p)
+            try:
+                yield context
+            finally:
+                # コンテキストを閉じる（永続プロファイルの場合はブラウザも閉じられ、常駐ブラウザは残る）
+                context.close()
+
+    def _cdp_endpoint(self) -> Optional[str]:
+        """常駐ブラウザのエンドポイントを返す（未設定の場合はNone）"""
+        return os.environ.get("PLAYWRIGHT_CDP_ENDPOINT") or None
+
     def _launch_browser(self, playwright):
         """通常のブラウザインスタンスを起動する
         
+        環境変数 PLAYWRIGHT_CDP_ENDPOINT が設定されている場合は、
+        起動する代わりにそのエンドポイントの常駐ブラウザへ接続する
+        
         Args:
             playwright: Playwrightインスタンス
             
         Returns:
-            Browser: 起動されたブラウザインスタンス
+            Browser: 起動（または接続）されたブラウザインスタンス
         """
+        endpoint = self._cdp_endpoint()
+        if endpoint:
+            return playwright.chromium.connect_over_cdp(endpoint)
+        
         launch_options = {
             "headless": False
         }
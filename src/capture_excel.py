@@ -0,0 +1,24 @@
+from pydantic import Field
+from capture_automation import Capture
+from image_to_excel import ExcelPlacement, ImageToExcelConfig
+
+class CaptureExcelConfig(Capture):
+    """キャプチャ設定と、そのスクリーンショットをExcelに貼り付ける位置を格納するクラス
+
+    JSONから1回の検証でキャプチャ設定と貼り付け設定の両方を作成するために使う
+    """
+    excel: ExcelPlacement = Field(..., description="スクリーンショットを貼り付けるシート・セル位置とサイズ")
+
+    def to_image_config(self) -> ImageToExcelConfig:
+        """取得したスクリーンショットの貼り付け設定を作成する
+
+        Returns:
+            ImageToExcelConfig: スクリーンショットのパスと貼り付け位置を持つ設定
+        """
+        return ImageToExcelConfig(
+            image_path=self.screenshot_path,
+            sheet_name=self.excel.sheet_name,
+            cell=self.excel.cell,
+            width_cm=self.excel.width_cm,
+            height_cm=self.excel.height_cm
+        )
@@ -1,78 +1,106 @@
+import re
+from io import BytesIO
 from pathlib import Path
-from pydantic import BaseModel, Field, validator
+from PIL import Image as PILImage
+from pydantic import BaseModel, Field, field_validator
 from openpyxl import load_workbook
 from openpyxl.drawing.image import Image
-from typing import Optional
-from shutil import copy2
+from openpyxl.drawing.spreadsheet_drawing import AnchorMarker, OneCellAnchor
+from openpyxl.drawing.xdr import XDRPositiveSize2D
+from openpyxl.utils.cell import coordinate_to_tuple
+from openpyxl.utils.units import cm_to_EMU, EMU_to_pixels
+from typing import Iterable, Optional
 
-class ImageToExcelConfig(BaseModel):
-    """画像をExcelに貼り付けるための設定を格納するクラス"""
-    image_path: str = Field(..., description="画像ファイルのパス")
+# セル位置（例: 'A1'）の形式
+_CELL_PATTERN = re.compile(r"([A-Za-z]+)([0-9]+)")
+
+class ExcelPlacement(BaseModel):
+    """画像を貼り付けるシート・セル位置とサイズを格納するクラス"""
     sheet_name: str | int = Field(..., description="貼り付けるシート名またはインデックス（0始まり）")
     cell: str = Field(..., description="貼り付けるセル位置 (例: 'A1')")
     width_cm: float = Field(..., gt=0, description="貼り付ける画像の幅 (cm)")
     height_cm: float = Field(..., gt=0, description="貼り付ける画像の高さ (cm)")
 
-    @validator('image_path')
-    def validate_image_path(cls, v):
-        """画像ファイルのパスを検証"""
-        path = Path(v)
-        if not path.exists():
-            raise ValueError(f"画像ファイルが存在しません: {v}")
-        if path.suffix.lower() not in ['.png', '.jpg', '.jpeg', '.gif', '.bmp']:
-            raise ValueError(f"サポートされていない画像形式です: {path.suffix}")
-        return str(path)
-
-    @validator('cell')
+    @field_validator('cell')
+    @classmethod
     def validate_cell(cls, v):
-        """セル位置の形式を検証"""
+        """セル位置の形式を検証し、列名を大文字に正規化する"""
         # 文字列が空でないことを確認
         if not v:
             raise ValueError("セル位置が指定されていません")
         
-        # アルファベット部分と数字部分に分割
-        alpha_part = ""
-        digit_part = ""
-        
-        for char in v:
-            if char.isalpha():
-                if digit_part:  # 数字の後にアルファベットが来た場合
-                    raise ValueError(f"無効なセル位置です: {v}")
-                alpha_part += char.upper()
-            elif char.isdigit():
-                digit_part += char
-            else:
-                raise ValueError(f"無効なセル位置です: {v}")
-        
-        # 両方の部分が存在することを確認
-        if not alpha_part or not digit_part:
+        # 列（アルファベット）と行（数字）の組み合わせであることを確認
+        match = _CELL_PATTERN.fullmatch(v)
+        if match is None:
             raise ValueError(f"無効なセル位置です: {v}")
             
-        return v
+        return f"{match.group(1).upper()}{match.group(2)}"
 
-    @validator('sheet_name')
+    @field_validator('sheet_name')
+    @classmethod
     def validate_sheet_name(cls, v):
         """シート名または番号を検証"""
         if isinstance(v, int) and v < 0:
             raise ValueError("シート番号は0以上の値を指定してください")
         return v
 
-    def to_pixels(self) -> tuple[float, float]:
-        """cmをピクセルに変換"""
-        PIXELS_PER_CM = 37.795275591  # 1cmあたりのピクセル数
-        width_px = self.width_cm * PIXELS_PER_CM
-        height_px = self.height_cm * PIXELS_PER_CM
-        return width_px, height_px
+    def to_emu(self) -> tuple[int, int]:
+        """cmをEMU（Excelの描画座標単位）に変換"""
+        return cm_to_EMU(self.width_cm), cm_to_EMU(self.height_cm)
+
+class ImageToExcelConfig(ExcelPlacement):
+    """画像をExcelに貼り付けるための設定を格納するクラス"""
+    image_path: str = Field(..., description="画像ファイルのパス")
+
+    @field_validator('image_path')
+    @classmethod
+    def validate_image_path(cls, v):
+        """画像ファイルのパスを検証"""
+        path = Path(v)
+        if not path.exists():
+            raise ValueError(f"画像ファイルが存在しません: {v}")
+        if path.suffix.lower() not in ['.png', '.jpg', '.jpeg', '.gif', '.bmp']:
+            raise ValueError(f"サポートされていない画像形式です: {path.suffix}")
+        return str(path)
+
+def _downscale_image(img: PILImage.Image, width: int, height: int) -> bytes | None:
+    """画像を指定サイズに縮小してエンコードしたバイト列を返す
+    
+    Args:
+        img (PILImage.Image): 元画像
+        width (int): 縮小後の幅 (px)
+        height (int): 縮小後の高さ (px)
+    
+    Returns:
+        bytes | None: 縮小した画像のバイト列。元画像が指定サイズ以下の場合はNone
+    """
+    if img.width <= width and img.height <= height:
+        return None
+    
+    source_format = img.format
+    if img.mode in ("P", "1"):
+        # パレット画像はそのままだと最近傍補間になるため変換してから縮小する
+        img = img.convert("RGBA")
+    resized = img.resize((max(width, 1), max(height, 1)), PILImage.LANCZOS)
+    
+    # openpyxlは埋め込み時にバッファを閉じるため、BytesIOではなくバイト列で返す
+    buf = BytesIO()
+    if source_format == "JPEG":
+        resized.save(buf, format="JPEG", quality=90)
+    else:
+        resized.save(buf, format="PNG", optimize=True)
+    return buf.getvalue()
 
 def insert_image_to_excel(
-    configs: list[ImageToExcelConfig], 
+    configs: Iterable[ImageToExcelConfig], 
     input_excel: Path, 
     output_excel: Optional[Path] = None
 ) -> Path:
     """画像をExcelの指定位置に貼り付ける
     
     Args:
-        configs (list[ImageToExcelConfig]): 画像貼り付けの設定のリスト
+        configs (Iterable[ImageToExcelConfig]): 画像貼り付けの設定。先頭から1件ずつ処理するため、
+            キャプチャ結果を順に返すジェネレータもそのまま渡せる
         input_excel (Path): 入力Excelファイルのパス
         output_excel (Optional[Path]): 出力Excelファイルのパス。
             Noneの場合は入力ファイル名に '_with_images' を追加
@@ -87,11 +115,14 @@ def insert_image_to_excel(
     if output_excel is None:
         output_excel = input_excel.parent / f"{input_excel.stem}_with_images{input_excel.suffix}"
     
-    # 入力ファイルを出力先にコピー
-    copy2(input_excel, output_excel)
+    # 入力ファイルを直接読み込み、保存時に出力先へ書き出す（事前のファイルコピーは不要）
+    # マクロ有効ブックの場合はVBAプロジェクトも保持する
+    wb = load_workbook(input_excel, keep_vba=input_excel.suffix.lower() == ".xlsm")
     
-    # Excelファイルを読み込む
-    wb = load_workbook(output_excel)
+    # 同じ画像が複数の設定に現れても一度だけ読み込み・リサイズするためのキャッシュ
+    # デコード済みの画像は保持せず（全画素がメモリに残るため）、サイズと縮小後のバイト列のみ保持する
+    image_sizes: dict[str, tuple[int, int]] = {}
+    resized_images: dict[tuple[str, int, int], bytes | None] = {}
     
     for config in configs:
         # シートを取得
@@ -106,31 +137,52 @@ def insert_image_to_excel(
         
         ws = wb[sheet_name]
         
-        # 画像をExcel用に変換
-        excel_img = Image(config.image_path)
+        # 画像のサイズを取得する（ヘッダのみ読み込み、画素はデコードしない）
+        size = image_sizes.get(config.image_path)
+        if size is None:
+            with PILImage.open(config.image_path) as pil_img:
+                size = image_sizes[config.image_path] = pil_img.size
         
         # アスペクト比を計算
-        aspect_ratio = excel_img.width / excel_img.height
+        aspect_ratio = size[0] / size[1]
         
-        # cmをピクセルに変換
-        width_px, height_px = config.to_pixels()
+        # cmをEMUに変換
+        width_emu, height_emu = config.to_emu()
         
-        # 指定されたサイズに合わせて画像をリサイズ
-        if width_px / height_px > aspect_ratio:
-            # 高さに合わせてリサイズ
-            new_width = int(height_px * aspect_ratio)
-            new_height = int(height_px)
+        # 指定された枠に収まるよう、アスペクト比を保ってサイズを決める
+        if width_emu / height_emu > aspect_ratio:
+            # 高さに合わせる
+            new_width_emu = int(height_emu * aspect_ratio)
+            new_height_emu = height_emu
         else:
-            # 幅に合わせてリサイズ
-            new_width = int(width_px)
-            new_height = int(width_px / aspect_ratio)
+            # 幅に合わせる
+            new_width_emu = width_emu
+            new_height_emu = int(width_emu / aspect_ratio)
         
-        excel_img.width = new_width
-        excel_img.height = new_height
+        # 縮小後の画素数は表示サイズ（96dpi換算）に合わせる
+        new_width = EMU_to_pixels(new_width_emu)
+        new_height = EMU_to_pixels(new_height_emu)
         
-        # 画像を貼り付ける
-        ws.add_image(excel_img, config.cell)
-    
+        # 表示サイズまで縮小した画像を埋め込み、xlsxに元解像度の画素を持たせない
+        key = (config.image_path, new_width, new_height)
+        if key not in resized_images:
+            # 縮小後は閉じて、元解像度の画素を次の画像の処理まで残さない
+            with PILImage.open(config.image_path) as pil_img:
+                resized_images[key] = _downscale_image(pil_img, new_width, new_height)
+        resized = resized_images[key]
+        
+        # 画像をExcel用に変換（縮小不要な場合のみ元ファイルを読み込み、保存時にファイルを開き直さない）
+        data = resized if resized is not None else Path(config.image_path).read_bytes()
+        excel_img = Image(BytesIO(data))
+        
+        # 表示サイズをEMUで直接指定したアンカーで貼り付ける（ピクセル経由の丸めを避ける）
+        row, col = coordinate_to_tuple(config.cell)
+        anchor = OneCellAnchor(
+            _from=AnchorMarker(col=col - 1, row=row - 1),
+            ext=XDRPositiveSize2D(cx=new_width_emu, cy=new_height_emu)
+        )
+        ws.add_image(excel_img, anchor)
+
     # 変更を保存
     wb.save(output_excel)
     
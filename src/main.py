@@ -1,64 +1,138 @@
+from __future__ import annotations
+
 import argparse
+import csv
 import json
+import re
+import shlex
+import sys
+from contextlib import closing
+from functools import cache
 from pathlib import Path
-from dotenv import load_dotenv
-from capture_automation import CaptureAutomation, Capture
-from image_to_excel import ImageToExcelConfig, insert_image_to_excel
+from typing import TYPE_CHECKING, Iterator
+
+# Playwright・openpyxl・pydanticは読み込みが重いため、使用するサブコマンドの中で遅延importする
+if TYPE_CHECKING:
+    from pydantic import BaseModel, TypeAdapter
+    from capture_automation import CaptureAutomation, Capture
+    from image_to_excel import ImageToExcelConfig
+    from capture_excel import CaptureExcelConfig
+
+# JSONのルート要素（配列またはオブジェクト）の判定用
+_JSON_ROOT_PATTERN = re.compile(rb"\s*([\[{])")
+
+@cache
+def _capture_list_adapter() -> TypeAdapter:
+    """キャプチャ設定リスト用のTypeAdapterを返す（構築コストが高いため初回のみ作成）"""
+    from pydantic import TypeAdapter
+    from capture_automation import Capture
+    return TypeAdapter(list[Capture])
+
+@cache
+def _image_config_list_adapter() -> TypeAdapter:
+    """画像貼り付け設定リスト用のTypeAdapterを返す（構築コストが高いため初回のみ作成）"""
+    from pydantic import TypeAdapter
+    from image_to_excel import ImageToExcelConfig
+    return TypeAdapter(list[ImageToExcelConfig])
+
+@cache
+def _capture_excel_list_adapter() -> TypeAdapter:
+    """キャプチャ＆Excel貼り付け設定リスト用のTypeAdapterを返す（構築コストが高いため初回のみ作成）"""
+    from pydantic import TypeAdapter
+    from capture_excel import CaptureExcelConfig
+    return TypeAdapter(list[CaptureExcelConfig])
+
+@cache
+def get_ca() -> CaptureAutomation:
+    """プロセス内で共有するCaptureAutomationを返す（初回呼び出し時に作成）
+    
+    with ブロックは入れ子にできるため、共有インスタンスを複数の箇所で with に使っても
+    ブラウザは一度だけ起動される
+    """
+    from capture_automation import CaptureAutomation
+    return CaptureAutomation()
 
-load_dotenv()
+def _validate_json_models(data: bytes, list_adapter: TypeAdapter, model: type[BaseModel]) -> list:
+    """JSONのバイト列をPythonのdict/listに展開せず、pydantic-coreで直接モデルのリストに変換する"""
+    root = _JSON_ROOT_PATTERN.match(data)
+    if root is None:
+        raise ValueError("Invalid JSON format. Expected an object or array of objects.")
+    
+    if root.group(1) == b"[":
+        return list_adapter.validate_json(data)
+    else:
+        return [model.model_validate_json(data)]
 
 def load_captures_from_json(json_file: str) -> list[Capture]:
     """JSONファイルからキャプチャ設定を読み込む"""
-    with open(json_file, 'r') as f:
-        data = json.load(f)
+    from capture_automation import Capture
     
-    if isinstance(data, list):
-        return [Capture(**item) for item in data]
-    elif isinstance(data, dict):
-        return [Capture(**data)]
-    else:
-        raise ValueError("Invalid JSON format. Expected an object or array of objects.")
+    # テキストとしてデコードせず、バイト列のままネイティブのJSONパーサに渡す
+    data = Path(json_file).read_bytes()
+    return _validate_json_models(data, _capture_list_adapter(), Capture)
 
 def load_image_configs_from_json(json_file: str) -> list[ImageToExcelConfig]:
     """JSONファイルから画像貼り付け設定を読み込む"""
-    with open(json_file, 'r') as f:
-        data = json.load(f)
+    from image_to_excel import ImageToExcelConfig
     
-    if isinstance(data, list):
-        return [ImageToExcelConfig(**item) for item in data]
-    elif isinstance(data, dict):
-        return [ImageToExcelConfig(**data)]
-    else:
-        raise ValueError("Invalid JSON format. Expected an object or array of objects.")
+    # テキストとしてデコードせず、バイト列のままネイティブのJSONパーサに渡す
+    data = Path(json_file).read_bytes()
+    return _validate_json_models(data, _image_config_list_adapter(), ImageToExcelConfig)
 
-def main() -> None:
-    parser = argparse.ArgumentParser(description="Capture Automation Tool")
-    subparsers = parser.add_subparsers(dest="command", help="Commands")
+def load_capture_excel_configs_from_json(json_file: str) -> list[CaptureExcelConfig]:
+    """JSONファイルからキャプチャ＆Excel貼り付け設定を読み込む"""
+    from capture_excel import CaptureExcelConfig
+    
+    # キャプチャ設定と貼り付け設定を1回の検証でまとめてモデルに変換する
+    data = Path(json_file).read_bytes()
+    return _validate_json_models(data, _capture_excel_list_adapter(), CaptureExcelConfig)
+
+def run_captures(ca: CaptureAutomation, captures: list[Capture], concurrency: int) -> Iterator[Capture]:
+    """同時実行数に応じて逐次または並行でキャプチャを取得する（結果は入力順）
     
-    # ログインコマンド
+    逐次の場合は1件取得するごとに結果を返すため、後続の処理を全件の完了を待たずに進められる
+    """
+    if concurrency > 1:
+        yield from ca.captures_parallel(captures, concurrency=concurrency)
+        return
+    
+    # 全キャプチャのビューポートサイズが同じなら、1つのタブで連続して取得する
+    burst_mode = len({capture.viewport_size for capture in captures}) <= 1
+    yield from ca.iter_captures(captures, burst_mode=burst_mode)
+
+def _add_login_parser(subparsers) -> None:
+    """ログインコマンドの引数を定義する"""
     login_parser = subparsers.add_parser("login", help="Login to web service and save session")
     login_parser.add_argument("url", help="Login URL")
-    
-    # キャプチャコマンド
+
+def _add_capture_parser(subparsers) -> None:
+    """キャプチャコマンドの引数を定義する"""
     capture_parser = subparsers.add_parser("capture", help="Capture screenshot of specified URL")
     capture_parser.add_argument("url", help="URL to capture")
-    capture_parser.add_argument("--wait", type=int, default=5, help="Wait time after page load (seconds)")
+    capture_parser.add_argument("--wait", type=int, default=5, help="Max wait for network idle after page load (seconds)")
     capture_parser.add_argument("--selector", help="CSS selector to wait for")
     capture_parser.add_argument("--filename", help="Output filename")
     capture_parser.add_argument("--no-fullpage", action="store_true", help="Disable full page capture")
     capture_parser.add_argument("--viewport", help="Viewport size (e.g., 1920x1080)")
-    
-    # 複数URLキャプチャコマンド（URLリスト）
+    capture_parser.add_argument("--format", choices=["png", "jpeg"], default="png", help="Screenshot image format")
+    capture_parser.add_argument("--quality", type=int, default=80, help="JPEG quality (0-100)")
+
+def _add_captures_parser(subparsers) -> None:
+    """複数URLキャプチャコマンド（URLリスト）の引数を定義する"""
     captures_parser = subparsers.add_parser("captures", help="Capture multiple URLs")
     captures_group = captures_parser.add_mutually_exclusive_group(required=True)
     captures_group.add_argument("--urls", nargs="+", help="URLs to capture")
     captures_group.add_argument("--json", help="JSON file containing capture configurations")
-    captures_parser.add_argument("--wait", type=int, default=5, help="Wait time after page load (seconds)")
+    captures_parser.add_argument("--wait", type=int, default=5, help="Max wait for network idle after page load (seconds)")
     captures_parser.add_argument("--selector", help="CSS selector to wait for")
     captures_parser.add_argument("--no-fullpage", action="store_true", help="Disable full page capture")
     captures_parser.add_argument("--viewport", help="Viewport size (e.g., 1920x1080)")
+    captures_parser.add_argument("--format", choices=["png", "jpeg"], default="png", help="Screenshot image format")
+    captures_parser.add_argument("--quality", type=int, default=80, help="JPEG quality (0-100)")
+    captures_parser.add_argument("--concurrency", type=int, default=1, help="Number of pages to capture concurrently")
 
-    # Excel画像貼り付けコマンド
+def _add_excel_parser(subparsers) -> None:
+    """Excel画像貼り付けコマンドの引数を定義する"""
     excel_parser = subparsers.add_parser("excel", help="Insert images into Excel")
     excel_parser.add_argument("input_excel", type=Path, help="Input Excel file path")
     excel_parser.add_argument("--output", "-o", type=Path, help="Output Excel file path")
@@ -66,32 +140,109 @@ def main() -> None:
     excel_group.add_argument("--json", help="JSON file containing image configurations")
     excel_group.add_argument("--config", "-c", nargs="+", help="Direct configuration in format: image_path,sheet,cell,width_cm,height_cm")
 
-    # キャプチャ＆Excel貼り付けコマンド
+def _add_capture_excel_parser(subparsers) -> None:
+    """キャプチャ＆Excel貼り付けコマンドの引数を定義する"""
     capture_excel_parser = subparsers.add_parser("capture-excel", 
         help="Capture screenshots and insert them into Excel")
     capture_excel_parser.add_argument("json", help="JSON file containing capture and excel configurations")
     capture_excel_parser.add_argument("input_excel", type=Path, help="Input Excel file path")
     capture_excel_parser.add_argument("--output", "-o", type=Path, help="Output Excel file path")
+    capture_excel_parser.add_argument("--concurrency", type=int, default=1, help="Number of pages to capture concurrently")
+
+def _add_start_browser_parser(subparsers) -> None:
+    """常駐ブラウザ起動コマンドの引数を定義する"""
+    browser_parser = subparsers.add_parser("start-browser",
+        help="Start a resident browser to reuse via PLAYWRIGHT_CDP_ENDPOINT")
+    browser_parser.add_argument("--port", type=int, default=9222, help="Remote debugging port")
+
+# サブコマンド名と引数定義関数の対応（ヘルプ表示時の並び順を兼ねる）
+_SUBCOMMAND_BUILDERS = {
+    "login": _add_login_parser,
+    "capture": _add_capture_parser,
+    "captures": _add_captures_parser,
+    "excel": _add_excel_parser,
+    "capture-excel": _add_capture_excel_parser,
+    "start-browser": _add_start_browser_parser,
+}
 
-    args = parser.parse_args()
+def build_parser(command: str | None = None) -> argparse.ArgumentParser:
+    """コマンドライン引数のパーサを構築する
+    
+    Args:
+        command (str | None): 実行するサブコマンド名。既知のサブコマンドの場合は
+            そのサブコマンドのパーサのみを構築し、それ以外（ヘルプや不正な値）は全て構築する
+    
+    Returns:
+        argparse.ArgumentParser: 構築したパーサ
+    """
+    parser = argparse.ArgumentParser(description="Capture Automation Tool")
+    parser.add_argument("--keep-alive", action="store_true",
+        help="Keep the browser open and read further commands from stdin")
+    subparsers = parser.add_subparsers(dest="command", help="Commands")
+    
+    builder = _SUBCOMMAND_BUILDERS.get(command)
+    builders = [builder] if builder is not None else _SUBCOMMAND_BUILDERS.values()
+    for add_parser in builders:
+        add_parser(subparsers)
     
+    return parser
+
+def _run_keep_alive() -> None:
+    """標準入力から1行ずつコマンドを読み込んで実行する（EOFまたは exit で終了）"""
+    prompt = "> " if sys.stdin.isatty() else ""
+    while True:
+        try:
+            line = input(prompt)
+        except EOFError:
+            break
+        
+        try:
+            tokens = shlex.split(line)
+        except ValueError as e:
+            print(f"Error: {e}")
+            continue
+        if not tokens:
+            continue
+        if tokens[0] in ("exit", "quit"):
+            break
+        
+        parser = build_parser(tokens[0])
+        try:
+            args = parser.parse_args(tokens)
+        except SystemExit:
+            # 引数エラーやヘルプ表示で終了せず、次のコマンドを待つ
+            continue
+        
+        _run_keep_alive_command(args, parser)
+
+def _run_keep_alive_command(args: argparse.Namespace, parser: argparse.ArgumentParser) -> None:
+    """対話モードで1つのコマンドを実行する（失敗しても起動中のブラウザは終了させない）"""
+    try:
+        _run(args, parser)
+    except Exception as e:
+        print(f"Error: {e}")
+
+def _run(args: argparse.Namespace, parser: argparse.ArgumentParser) -> None:
+    """解析済みの引数に応じてサブコマンドを実行する"""
     if args.command == "excel":
+        from image_to_excel import ImageToExcelConfig, insert_image_to_excel
+        
         try:
             if args.json:
                 # JSONファイルから設定を読み込む
                 configs = load_image_configs_from_json(args.json)
             else:
-                # コマンドライン引数から設定を作成
-                configs = []
-                for config_str in args.config:
-                    img_path, sheet, cell, width, height = config_str.split(',')
-                    configs.append(ImageToExcelConfig(
+                # コマンドライン引数から設定を作成（CSVとして解析し、引用符で囲んだカンマにも対応する）
+                configs = [
+                    ImageToExcelConfig(
                         image_path=img_path,
                         sheet_name=int(sheet) if sheet.isdigit() else sheet,
                         cell=cell,
                         width_cm=float(width),
                         height_cm=float(height)
-                    ))
+                    )
+                    for img_path, sheet, cell, width, height in csv.reader(args.config)
+                ]
             
             output_path = insert_image_to_excel(configs, args.input_excel, args.output)
             print(f"Images inserted successfully. Output saved to: {output_path}")
@@ -104,7 +255,7 @@ def main() -> None:
             return
     
     elif args.command == "login":
-        ca = CaptureAutomation()
+        ca = get_ca()
         session_file = ca.login(
             login_url=args.url
         )
@@ -112,7 +263,9 @@ def main() -> None:
             print(f"Session information saved: {session_file}")
         
     elif args.command == "capture":
-        ca = CaptureAutomation()
+        from capture_automation import Capture
+        
+        ca = get_ca()
         
         try:
             capture = Capture(
@@ -121,7 +274,9 @@ def main() -> None:
                 selector=args.selector,
                 fullpage=not args.no_fullpage,
                 filename=args.filename,
-                viewport_size=args.viewport
+                viewport_size=args.viewport,
+                format=args.format,
+                quality=args.quality
             )
             
             screenshot_path = ca.capture(capture)
@@ -132,13 +287,18 @@ def main() -> None:
             return
 
     elif args.command == "captures":
-        ca = CaptureAutomation()
+        from capture_automation import Capture, parse_viewport_size
+        
+        ca = get_ca()
         
         try:
             if args.json:
                 # JSONファイルから設定を読み込む
                 captures = load_captures_from_json(args.json)
             else:
+                # 全URLで共通のビューポートサイズは一度だけ解析する
+                viewport_size = parse_viewport_size(args.viewport) if args.viewport else None
+                
                 # コマンドライン引数から設定を作成
                 captures = [
                     Capture(
@@ -146,16 +306,21 @@ def main() -> None:
                         wait_time=args.wait,
                         selector=args.selector,
                         fullpage=not args.no_fullpage,
-                        viewport_size=args.viewport
+                        viewport_size=viewport_size,
+                        format=args.format,
+                        quality=args.quality
                     )
                     for url in args.urls
                 ]
             
-            results = ca.captures(captures)
+            results = run_captures(ca, captures, args.concurrency)
             
-            for result in results:
-                print(f"URL: {result.url}")
-                print(f"Saved to: {result.screenshot_path}\n")
+            # 結果はURLごとに出力せず、まとめて一度に書き出す
+            sys.stdout.write("".join(
+                f"URL: {result.url}\nSaved to: {result.screenshot_path}\n\n"
+                for result in results
+            ))
+            sys.stdout.flush()
             
         except (ValueError, json.JSONDecodeError) as e:
             print(f"Error: {e}")
@@ -165,41 +330,18 @@ def main() -> None:
             return
         
     elif args.command == "capture-excel":
+        from image_to_excel import insert_image_to_excel
+        
         try:
-            # JSONファイルから設定を読み込む
-            with open(args.json, 'r') as f:
-                configs = json.load(f)
-
-            # キャプチャ設定のみ先に作成
-            captures = [
-                Capture(
-                    url=config['url'],
-                    wait_time=config.get('wait_time', 5),
-                    selector=config.get('selector'),
-                    fullpage=config.get('fullpage', True),
-                    viewport_size=config.get('viewport_size')
-                )
-                for config in configs
-            ]
-
-            # スクリーンショットを取得
-            ca = CaptureAutomation()
-            capture_results = ca.captures(captures)
-
-            # キャプチャ結果を使ってExcel設定を作成
-            excel_configs = [
-                ImageToExcelConfig(
-                    image_path=result.screenshot_path,
-                    sheet_name=configs[i]['excel']['sheet_name'],
-                    cell=configs[i]['excel']['cell'],
-                    width_cm=configs[i]['excel']['width_cm'],
-                    height_cm=configs[i]['excel']['height_cm']
-                )
-                for i, result in enumerate(capture_results)
-            ]
-
-            # Excelに画像を貼り付け
-            output_path = insert_image_to_excel(excel_configs, args.input_excel, args.output)
+            # JSONファイルからキャプチャ設定と貼り付け設定を読み込む
+            configs = load_capture_excel_configs_from_json(args.json)
+
+            # スクリーンショットを取得し、1件取得するごとにExcelに貼り付ける
+            # （貼り付けが途中で失敗した場合もブラウザを閉じるため closing で囲む）
+            ca = get_ca()
+            with closing(run_captures(ca, configs, args.concurrency)) as capture_results:
+                excel_configs = (result.to_image_config() for result in capture_results)
+                output_path = insert_image_to_excel(excel_configs, args.input_excel, args.output)
             print(f"処理が完了しました。出力ファイル: {output_path}")
 
         except (ValueError, json.JSONDecodeError) as e:
@@ -209,8 +351,35 @@ def main() -> None:
             print(f"エラー: ファイルが見つかりません: {e}")
             return
     
+    elif args.command == "start-browser":
+        ca = get_ca()
+        
+        try:
+            endpoint = ca.start_browser_daemon(port=args.port)
+        except RuntimeError as e:
+            print(f"Error: {e}")
+            return
+        
+        print(f"Browser started: {endpoint}")
+        print(f"Set PLAYWRIGHT_CDP_ENDPOINT={endpoint} to reuse it from later runs")
+    
     else:
         parser.print_help()
 
+def main() -> None:
+    # 実行するサブコマンドが分かっている場合は、そのサブコマンドのパーサだけを構築する
+    argv = sys.argv[1:]
+    parser = build_parser(argv[0] if argv else None)
+    args = parser.parse_args(argv)
+    
+    if args.keep_alive:
+        # ブラウザを起動したまま、標準入力から続けてコマンドを受け付ける
+        with get_ca():
+            if args.command:
+                _run_keep_alive_command(args, parser)
+            _run_keep_alive()
+    else:
+        _run(args, parser)
+
 if __name__ == "__main__":
     main() 
\ No newline at end of file